@@ -1,15 +1,62 @@
 # backend/app.py
+import asyncio
+import functools
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
+from batching import MicroBatcher
 from retrieval import RetrievalEngine
 from scoring import HallucinationScorer
 from counterevidence import generate_counter_evidence
 
-app = FastAPI(title="Lightweight Hallucination Detector")
+app = FastAPI(title="Lightweight Hallucination Detector", default_response_class=ORJSONResponse)
+
+
+class GzipRequestMiddleware:
+    """Transparently inflate gzip-compressed request bodies.
+
+    The frontend gzips large /verify and /verify_batch payloads; Starlette's
+    GZipMiddleware only compresses responses, so inbound bodies are handled
+    here before routing sees them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            if headers.get(b"content-encoding") == b"gzip":
+                chunks = []
+                while True:
+                    message = await receive()
+                    chunks.append(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        break
+                body = gzip.decompress(b"".join(chunks))
+                scope = dict(scope)
+                scope["headers"] = [
+                    (k, v) for k, v in scope["headers"]
+                    if k not in (b"content-encoding", b"content-length")
+                ] + [(b"content-length", str(len(body)).encode())]
+
+                async def receive_inflated():
+                    return {"type": "http.request", "body": body, "more_body": False}
+
+                await self.app(scope, receive_inflated, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(GzipRequestMiddleware)
 
 # ---- CORS ----
 app.add_middleware(
@@ -23,6 +70,18 @@ app.add_middleware(
 # ---- Engines ----
 retrieval_engine: Optional[RetrievalEngine] = None
 scorer: Optional[HallucinationScorer] = None
+executor: Optional[ThreadPoolExecutor] = None
+batcher: Optional[MicroBatcher] = None
+nli_model = None
+
+NLI_MODEL_NAME = "cross-encoder/nli-MiniLM2-L6-H768"
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a CPU-bound call (encode / FAISS search) on the worker pool so the
+    event loop stays free to overlap I/O like the Wikipedia fallback."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
 
 class QARequest(BaseModel):
     question: str
@@ -31,12 +90,35 @@ class QARequest(BaseModel):
     threshold_green: float = 0.70   # 0..1
     threshold_yellow: float = 0.40  # 0..1
 
+class QABatchRequest(BaseModel):
+    items: List[QARequest]
+
 @app.on_event("startup")
 def init_engines():
-    global retrieval_engine, scorer
+    global retrieval_engine, scorer, executor, batcher
     corpus_path = (Path(__file__).parent.parent / "data" / "corpus.json").resolve()
     retrieval_engine = RetrievalEngine(corpus_path=str(corpus_path))
     scorer = HallucinationScorer(retrieval_engine)
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    batcher = MicroBatcher(retrieval_engine.model, executor=executor)
+    batcher.start()
+
+    # Optional NLI cross-encoder for counter-evidence: scores (passage, claim)
+    # contradiction directly. If it can't load we keep the negation heuristic.
+    global nli_model
+    try:
+        from sentence_transformers import CrossEncoder
+        nli_model = CrossEncoder(NLI_MODEL_NAME)
+    except Exception:
+        nli_model = None
+
+
+@app.on_event("shutdown")
+async def shutdown_engines():
+    if batcher is not None:
+        batcher.stop()
+    if retrieval_engine is not None:
+        await retrieval_engine.close()
 
 # ---- Friendly root + health ----
 @app.get("/")
@@ -45,7 +127,7 @@ def root():
     return {
         "name": "Lightweight Hallucination Detector",
         "corpus_size": size,
-        "routes": ["/health", "/verify", "/demo"],
+        "routes": ["/health", "/verify", "/verify_batch", "/demo"],
     }
 
 @app.get("/health")
@@ -54,12 +136,14 @@ def health():
     return {"status": "ok", "corpus_size": size, "model": "all-MiniLM-L6-v2"}
 
 # ---- Core verification ----
-@app.post("/verify")
-def verify_qa(request: QARequest):
+async def _verify_one(request: QARequest):
     assert retrieval_engine is not None and scorer is not None, "Engines not initialized"
 
-    evidence = retrieval_engine.retrieve(request.question)
-    base = scorer.evaluate(request.answer, evidence)  # confidence in %
+    # One batched forward pass covers this request's question + answer, and
+    # concurrent requests piggyback on the same pass via the micro-batcher.
+    q_emb, a_emb = await batcher.encode([request.question, request.answer])
+    evidence = await retrieval_engine.retrieve_async(request.question, query_emb=q_emb)
+    base = await run_blocking(scorer.evaluate, request.answer, evidence, answer_emb=a_emb)  # confidence in %
 
     conf_pct = float(base.get("confidence", 0.0))
     conf = conf_pct / 100.0
@@ -72,21 +156,35 @@ def verify_qa(request: QARequest):
     base["verdict"] = verdict
 
     if request.include_counter:
-        base["counter_evidence"] = generate_counter_evidence(
-            request.question, request.answer, retrieval_engine
+        base["counter_evidence"] = await generate_counter_evidence(
+            request.question, request.answer, retrieval_engine, nli_model=nli_model
         )
 
+    base["question"] = request.question
+    base["answer"] = request.answer
     return base
 
+@app.post("/verify")
+async def verify_qa(request: QARequest):
+    return await _verify_one(request)
+
+@app.post("/verify_batch")
+async def verify_batch(batch: QABatchRequest):
+    """Verify several Q/A pairs in one HTTP round trip. Items run
+    concurrently, so their encodes coalesce in the micro-batcher."""
+    results = await asyncio.gather(*[_verify_one(item) for item in batch.items])
+    return {"results": list(results)}
+
 # ---- Demo route ----
 @app.get("/demo")
-def demo():
+async def demo():
     """Quick demo for judges: runs a built-in hallucination check."""
     assert retrieval_engine is not None and scorer is not None, "Engines not initialized"
     question = "Who founded SpaceX?"
     answer = "Jeff Bezos founded SpaceX."
-    evidence = retrieval_engine.retrieve(question)
-    base = scorer.evaluate(answer, evidence)
+    q_emb, a_emb = await batcher.encode([question, answer])
+    evidence = await retrieval_engine.retrieve_async(question, query_emb=q_emb)
+    base = await run_blocking(scorer.evaluate, answer, evidence, answer_emb=a_emb)
 
     conf_pct = float(base.get("confidence", 0.0))
     verdict = "Verified" if conf_pct/100 >= 0.70 else "Hallucination Suspected" if conf_pct/100 >= 0.40 else "Unverifiable"
@@ -0,0 +1,88 @@
+# backend/batching.py
+"""Micro-batching for encode() calls across concurrent requests.
+
+Each /verify request only needs a couple of sentences embedded; under load
+that means many tiny transformer forward passes whose cost is dominated by
+fixed dispatch overhead. MicroBatcher coalesces concurrent callers: requests
+drop their texts on a queue and a single background task drains up to
+MAX_BATCH entries (waiting at most WAIT_MS for stragglers), runs ONE encode
+over the combined batch sorted by length to minimize padding waste, and
+hands every caller back its own slice via a Future.
+"""
+import asyncio
+from functools import partial
+from typing import List, Optional
+
+import numpy as np
+
+MAX_BATCH = 32
+WAIT_MS = 15
+
+
+class MicroBatcher:
+    def __init__(self, model, executor=None, max_batch: int = MAX_BATCH, wait_ms: int = WAIT_MS):
+        self.model = model
+        self.executor = executor
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Unit-normalized embeddings for texts, one row per input."""
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((list(texts), fut))
+        return await fut
+
+    def _encode_sync(self, all_texts: List[str]) -> np.ndarray:
+        # Smart batching: encode in ascending length order so short sentences
+        # aren't padded out to the longest one in the batch, then unpermute.
+        order = sorted(range(len(all_texts)), key=lambda i: len(all_texts[i].split()))
+        embs = self.model.encode(
+            [all_texts[i] for i in order],
+            convert_to_numpy=True,
+            batch_size=64,
+            normalize_embeddings=True,
+        )
+        out = np.empty_like(embs)
+        out[order] = embs
+        return out
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self.queue.get()]
+            deadline = loop.time() + self.wait
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            all_texts = [t for texts, _ in pending for t in texts]
+            try:
+                embs = await loop.run_in_executor(
+                    self.executor, partial(self._encode_sync, all_texts)
+                )
+            except Exception as exc:
+                for _, fut in pending:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+
+            pos = 0
+            for texts, fut in pending:
+                if not fut.done():
+                    fut.set_result(embs[pos:pos + len(texts)])
+                pos += len(texts)
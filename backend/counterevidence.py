@@ -1,15 +1,19 @@
 # backend/counterevidence.py
 from typing import List, Dict, Any, Optional
+import asyncio
 import os
-from sentence_transformers import SentenceTransformer
 import numpy as np
 
 # Optional LLM (OpenAI). If no key, we fall back to simple splitting.
 USE_LLM = bool(os.environ.get("OPENAI_API_KEY"))
 
 if USE_LLM:
-    from openai import OpenAI
-    _client = OpenAI()
+    from openai import AsyncOpenAI
+    _client = AsyncOpenAI()
+
+# Minimum P(contradiction) from the NLI cross-encoder to call a claim
+# contradicted by a passage.
+_NLI_CONTRADICTION_THRESHOLD = 0.5
 
 def _simple_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
     # very lightweight fallback: split by '.' and keep short, declarative bits
@@ -17,7 +21,7 @@ def _simple_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
     parts = [p for p in parts if 4 < len(p.split()) < 30]
     return parts[:max_claims] or [answer]
 
-def extract_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
+async def extract_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
     if not USE_LLM:
         return _simple_atomic_claims(answer, max_claims)
 
@@ -27,7 +31,7 @@ def extract_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
         "Return them as a JSON array of strings ONLY.\n\nAnswer:\n" + answer
     )
     try:
-        resp = _client.chat.completions.create(
+        resp = await _client.chat.completions.create(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -41,27 +45,93 @@ def extract_atomic_claims(answer: str, max_claims: int = 3) -> List[str]:
     except Exception:
         return _simple_atomic_claims(answer, max_claims)
 
-def generate_counter_evidence(
+async def generate_counter_evidence(
     question: str,
     answer: str,
     retrieval_engine,
     max_claims: int = 3,
     top_k: int = 3,
     contradiction_margin: float = 0.15,
+    nli_model=None,
 ) -> Dict[str, Any]:
     """
-    For each atomic claim, retrieve evidence; compute similarity to the claim
-    AND similarity to a negated/alternative phrasing; pick passages that
-    contradict or fail to support the claim.
+    For each atomic claim, retrieve evidence; compute similarity to the claim;
+    then look for contradiction — with a cross-encoder NLI model scoring
+    (passage, claim) pairs directly when one is loaded, or by comparing
+    against a negated phrasing of the claim otherwise.
     """
-    model = SentenceTransformer("all-MiniLM-L6-v2")
-    claims = extract_atomic_claims(answer, max_claims=max_claims)
+    # Reuse the engine's model instead of loading a fresh copy per request.
+    model = retrieval_engine.model
+    claims = await extract_atomic_claims(answer, max_claims=max_claims)
 
-    results: List[Dict[str, Any]] = []
-    for claim in claims:
-        evi_docs = retrieval_engine.retrieve(claim, top_k=top_k)
+    # Retrieve evidence for all claims concurrently (each retrieval may hit
+    # the Wikipedia fallback, so overlapping them matters).
+    evi_lists = await asyncio.gather(
+        *[retrieval_engine.retrieve_async(claim, top_k) for claim in claims]
+    )
+
+    # Then encode what actually NEEDS encoding in one forward pass: claims,
+    # optional negations, and only the passages without a precomputed corpus
+    # embedding (i.e. Wikipedia-fallback snippets). Corpus hits reuse the
+    # vectors already built for the FAISS index. The negation text is only
+    # needed for the fallback contradiction heuristic.
+    use_nli = nli_model is not None
+    all_texts: List[str] = []
+    spans: List[tuple] = []  # (claim_pos, neg_pos or None) per claim; None if no evidence
+    passage_refs: List[list] = []  # per claim: ('corpus', row) or ('encode', pos) per passage
+    claim_passages: List[List[str]] = []
+    nli_pairs: List[tuple] = []
+    nli_spans: List[tuple] = []  # (start, end) into nli_pairs per claim
+    for claim, evi_docs in zip(claims, evi_lists):
         passages = [d["text"] for d in evi_docs]
+        claim_passages.append(passages)
         if not passages:
+            spans.append(None)
+            nli_spans.append(None)
+            passage_refs.append([])
+            continue
+        claim_pos = len(all_texts)
+        all_texts.append(claim)
+        neg_pos = None
+        if use_nli:
+            nli_spans.append((len(nli_pairs), len(nli_pairs) + len(passages)))
+            nli_pairs.extend((p, claim) for p in passages)
+        else:
+            # Simple “counter phrasing”: prepend NOT / opposite cue words and compare.
+            # (Crude but effective in practice for short claims)
+            neg_pos = len(all_texts)
+            all_texts.append("It is false that " + claim)
+            nli_spans.append(None)
+        refs = []
+        for d in evi_docs:
+            row = d.get("corpus_idx")
+            if row is not None:
+                refs.append(("corpus", row))
+            else:
+                refs.append(("encode", len(all_texts)))
+                all_texts.append(d["text"])
+        passage_refs.append(refs)
+        spans.append((claim_pos, neg_pos))
+
+    embs = None
+    if all_texts:
+        embs = await asyncio.to_thread(
+            model.encode,
+            all_texts, convert_to_numpy=True, batch_size=64, normalize_embeddings=True,
+        )
+
+    contra_probs = None
+    if use_nli and nli_pairs:
+        # One cross-encoder pass over every (passage, claim) pair of every
+        # claim; the model returns [contradiction, entailment, neutral] logits.
+        logits = await asyncio.to_thread(nli_model.predict, nli_pairs, batch_size=32)
+        logits = np.asarray(logits, dtype=np.float64)
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        contra_probs = exp[:, 0] / exp.sum(axis=1)
+
+    results: List[Dict[str, Any]] = []
+    for claim, span, nli_span, refs, passages in zip(claims, spans, nli_spans, passage_refs, claim_passages):
+        if span is None:
             results.append({
                 "claim": claim,
                 "status": "NoEvidence",
@@ -72,23 +142,31 @@ def generate_counter_evidence(
             })
             continue
 
-        # Encode
-        claim_emb = model.encode([claim], convert_to_numpy=True)
-        ev_emb = model.encode(passages, convert_to_numpy=True)
+        claim_pos, neg_pos = span
+        claim_emb = embs[claim_pos]
+        ev_emb = np.stack([
+            retrieval_engine.corpus_embedding(ref) if kind == "corpus" else embs[ref]
+            for kind, ref in refs
+        ])
 
-        # Support = similarity(claim, evidence)
-        sup = np.dot(ev_emb, claim_emb.T) / (np.linalg.norm(ev_emb, axis=1) * np.linalg.norm(claim_emb))
+        # Embeddings are unit-normalized, so a dot product IS the cosine.
+        sup = ev_emb @ claim_emb
         support_score = float(np.max(sup))
 
-        # Simple “counter phrasing”: prepend NOT / opposite cue words and compare.
-        # (Crude but effective in practice for short claims)
-        neg = "It is false that " + claim
-        neg_emb = model.encode([neg], convert_to_numpy=True)
-        contra = np.dot(ev_emb, neg_emb.T) / (np.linalg.norm(ev_emb, axis=1) * np.linalg.norm(neg_emb))
+        if use_nli:
+            contra = contra_probs[nli_span[0]:nli_span[1]]
+        else:
+            neg_emb = embs[neg_pos]
+            contra = ev_emb @ neg_emb
         contradiction_score = float(np.max(contra))
 
-        # Decide status
-        if contradiction_score > (support_score + contradiction_margin):
+        # Decide status. NLI probabilities are on their own scale, so they
+        # get an absolute threshold rather than the cosine margin.
+        if use_nli:
+            contradicted = contradiction_score > _NLI_CONTRADICTION_THRESHOLD
+        else:
+            contradicted = contradiction_score > (support_score + contradiction_margin)
+        if contradicted:
             status = "LikelyContradicted"
         elif support_score < 0.35:
             status = "Unverifiable"
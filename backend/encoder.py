@@ -0,0 +1,113 @@
+# backend/encoder.py
+"""ONNX Runtime backend for the MiniLM encoder.
+
+Exports all-MiniLM-L6-v2 to ONNX and applies dynamic INT8 quantization
+(2-4x faster than eager PyTorch on CPU). The quantized model is cached on
+disk so the export/quantize cost is paid once. `ONNXEncoder.encode` mirrors
+the subset of `SentenceTransformer.encode` the backend uses, so callers
+don't care which implementation they got.
+"""
+import functools
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_CACHE_DIR = Path(__file__).parent.parent / "data" / "minilm-onnx-int8"
+
+
+def _load_quantized(model_name: str):
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if not any(_CACHE_DIR.glob("*.onnx")):
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(_CACHE_DIR)
+        quantizer = ORTQuantizer.from_pretrained(_CACHE_DIR)
+        quantizer.quantize(
+            save_dir=str(_CACHE_DIR),
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False),
+        )
+    quantized = sorted(_CACHE_DIR.glob("*quantized*.onnx"))
+    file_name = quantized[-1].name if quantized else None
+    return ORTModelForFeatureExtraction.from_pretrained(_CACHE_DIR, file_name=file_name)
+
+
+class ONNXEncoder:
+    """Tokenize -> ONNX forward -> mean-pool -> (optional) L2-normalize."""
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = _load_quantized(model_name)
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        # Smart batching: group similar lengths so each batch pads only to its
+        # own longest sentence, then restore the caller's order at the end.
+        # (SentenceTransformer.encode does the same internally.)
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i].split()))
+
+        out = []
+        for start in range(0, len(order), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            enc = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=256, return_tensors="np"
+            )
+            hidden = self.model(**enc).last_hidden_state  # (B, T, D)
+            mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            out.append(np.asarray(pooled))
+
+        sorted_embs = np.concatenate(out, axis=0) if out else np.empty((0, 384))
+        embs = np.empty_like(sorted_embs)
+        embs[order] = sorted_embs
+        if normalize_embeddings:
+            norms = np.linalg.norm(embs, axis=1, keepdims=True)
+            embs = embs / np.clip(norms, 1e-12, None)
+        return embs
+
+
+def _tune_torch(model):
+    """Pin PyTorch thread counts so uvicorn workers don't fight over cores,
+    and run encode under inference_mode (no autograd tape per forward)."""
+    import torch
+
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, workers)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # only settable before the first parallel op; keep the default
+
+    orig_encode = model.encode
+
+    @functools.wraps(orig_encode)
+    def encode(*args, **kwargs):
+        with torch.inference_mode():
+            return orig_encode(*args, **kwargs)
+
+    model.encode = encode
+    return model
+
+
+def load_model():
+    """Best available MiniLM encoder: quantized ONNX if optimum/onnxruntime
+    is installed (and the export succeeds), eager SentenceTransformer otherwise."""
+    try:
+        return ONNXEncoder()
+    except Exception:
+        from sentence_transformers import SentenceTransformer
+        return _tune_torch(SentenceTransformer("all-MiniLM-L6-v2"))
@@ -1,114 +1,286 @@
-import json
+import asyncio
+import hashlib
+import orjson
+import sqlite3
+import threading
 import requests
+import aiohttp
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss
 
+from encoder import load_model
+
+_WIKI_API = "https://en.wikipedia.org/w/api.php"
+
 
 class RetrievalEngine:
     def __init__(self, corpus_path: str, wiki_fallback: bool = True, cache_path: str = None):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        self.model = load_model()
         self.corpus = self._load_corpus(corpus_path)
-        self.index, self.embeddings = self._build_index()
+        self.index, self.embeddings = self._load_or_build_index(corpus_path)
 
         self.wiki_fallback = wiki_fallback
-        self.cache_path = Path(cache_path) if cache_path else (Path(corpus_path).parent / "wiki_cache.json")
-
-        if not self.cache_path.exists():
-            self._write_cache({})
-        self._wiki_cache = self._read_cache()
+        self.cache_path = Path(cache_path) if cache_path else (Path(corpus_path).parent / "wiki_cache.db")
+        self._init_cache()
+        self._session: Optional[aiohttp.ClientSession] = None
 
     # ---------------- Corpus ----------------
     def _load_corpus(self, path: str) -> List[Dict[str, Any]]:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return data
+        # orjson: C parser, ~5x faster than stdlib json on large corpora.
+        return orjson.loads(Path(path).read_bytes())
+
+    # Below this corpus size the brute-force scan beats HNSW graph traversal.
+    _HNSW_MIN_DOCS = 500
 
     def _build_index(self):
         texts = [doc["text"] for doc in self.corpus]
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        # Bulk encode: length-sorted batches (done inside encode) and
+        # normalization during pooling, so no separate normalize_L2 pass.
+        embeddings = self.model.encode(
+            texts,
+            batch_size=64,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        )
         dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings)
+        if len(texts) >= self._HNSW_MIN_DOCS:
+            # Sublinear top-k; inner product == cosine after normalize_L2.
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 80
+            index.hnsw.efSearch = 32
+        else:
+            index = faiss.IndexFlatIP(dim)
         index.add(embeddings)
-        return index, embeddings
+        # FAISS needs float32 vectors in the index, but our own copy of the
+        # matrix is only read back for dot products — keep it at half
+        # precision (half the RAM/disk, half the bytes moved per lookup).
+        # Consumers upcast to float32 before computing.
+        return index, embeddings.astype(np.float16)
 
-    # ---------------- Cache ----------------
-    def _read_cache(self):
+    def _load_or_build_index(self, corpus_path: str):
+        # Key the cache files on the corpus contents so a corpus edit
+        # transparently triggers a rebuild.
+        digest = hashlib.sha256(Path(corpus_path).read_bytes()).hexdigest()[:16]
+        parent = Path(corpus_path).parent
+        faiss_path = parent / f"corpus.{digest}.faiss"
+        npy_path = parent / f"corpus.{digest}.npy"
+
+        if faiss_path.exists() and npy_path.exists():
+            # mmap both: zero transformer work at boot, pages load on demand.
+            index = faiss.read_index(str(faiss_path), faiss.IO_FLAG_MMAP)
+            embeddings = np.load(npy_path, mmap_mode="r")
+            return index, embeddings
+
+        index, embeddings = self._build_index()
         try:
-            with open(self.cache_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+            faiss.write_index(index, str(faiss_path))
+            np.save(npy_path, embeddings)
         except Exception:
-            return {}
+            pass  # read-only filesystem: just rebuild next boot
+        return index, embeddings
+
+    # ---------------- Cache (SQLite, WAL) ----------------
+    # O(1) inserts instead of rewriting a whole JSON blob per cache miss.
+    def _init_cache(self):
+        self._cache_lock = threading.Lock()
+        self._cache_db = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._cache_db.execute("PRAGMA journal_mode=WAL")
+        self._cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS wiki_cache (key TEXT PRIMARY KEY, blob TEXT)"
+        )
+        self._cache_db.commit()
+
+    def _cache_get(self, key: str):
+        with self._cache_lock:
+            row = self._cache_db.execute(
+                "SELECT blob FROM wiki_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
 
-    def _write_cache(self, data):
+    def _cache_put(self, key: str, snippets: List[Dict[str, str]]):
         try:
-            with open(self.cache_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with self._cache_lock:
+                self._cache_db.execute(
+                    "INSERT OR REPLACE INTO wiki_cache (key, blob) VALUES (?, ?)",
+                    (key, orjson.dumps(snippets)),
+                )
+                self._cache_db.commit()
         except Exception:
             pass
 
     # ---------------- Wikipedia Fallback ----------------
+    @staticmethod
+    def _search_params(query: str, max_results: int) -> Dict[str, Any]:
+        return {
+            "action": "query",
+            "list": "search",
+            "srsearch": query,
+            "format": "json",
+            "srlimit": max_results,
+        }
+
+    @staticmethod
+    def _extract_params(titles: List[str]) -> Dict[str, Any]:
+        return {
+            "action": "query",
+            "prop": "extracts",
+            "explaintext": 1,
+            "exintro": 1,
+            "titles": "|".join(titles),
+            "format": "json",
+        }
+
+    @staticmethod
+    def _snippets_from_pages(pages: Dict[str, Any]) -> List[Dict[str, str]]:
+        snippets: List[Dict[str, str]] = []
+        for _, p in pages.items():
+            extract = p.get("extract", "")
+            title = p.get("title", "")
+            if extract:
+                snippets.append({"id": f"wiki:{title}", "text": f"{title}. {extract}"})
+        return snippets
+
     def _fetch_wikipedia_snippets(self, query: str, max_results: int = 3, timeout: int = 5) -> List[Dict[str, str]]:
         key = query.lower().strip()
-        if key in self._wiki_cache:
-            return self._wiki_cache[key]
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
 
         snippets: List[Dict[str, str]] = []
         try:
             # Search step
-            sparams = {
-                "action": "query",
-                "list": "search",
-                "srsearch": query,
-                "format": "json",
-                "srlimit": max_results,
-            }
-            r = requests.get("https://en.wikipedia.org/w/api.php", params=sparams, timeout=timeout)
+            r = requests.get(_WIKI_API, params=self._search_params(query, max_results), timeout=timeout)
             r.raise_for_status()
-            data = r.json()
-            hits = data.get("query", {}).get("search", [])
+            hits = r.json().get("query", {}).get("search", [])
 
             titles = [h.get("title") for h in hits if h.get("title")]
             if titles:
-                tparams = {
-                    "action": "query",
-                    "prop": "extracts",
-                    "explaintext": 1,
-                    "exintro": 1,
-                    "titles": "|".join(titles),
-                    "format": "json",
-                }
-                r2 = requests.get("https://en.wikipedia.org/w/api.php", params=tparams, timeout=timeout)
+                r2 = requests.get(_WIKI_API, params=self._extract_params(titles), timeout=timeout)
                 r2.raise_for_status()
-                pages = r2.json().get("query", {}).get("pages", {})
-                for _, p in pages.items():
-                    extract = p.get("extract", "")
-                    title = p.get("title", "")
-                    if extract:
-                        snippets.append({"id": f"wiki:{title}", "text": f"{title}. {extract}"})
+                snippets = self._snippets_from_pages(r2.json().get("query", {}).get("pages", {}))
+        except Exception:
+            snippets = []
+
+        self._cache_put(key, snippets)
+        return snippets
+
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _fetch_wikipedia_snippets_async(self, query: str, max_results: int = 3, timeout: int = 5) -> List[Dict[str, str]]:
+        """Same two-step lookup as _fetch_wikipedia_snippets, but non-blocking:
+        the event loop stays free while Wikipedia responds."""
+        key = query.lower().strip()
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        snippets: List[Dict[str, str]] = []
+        try:
+            session = await self._ensure_session()
+            client_timeout = aiohttp.ClientTimeout(total=timeout)
+            async with session.get(_WIKI_API, params=self._search_params(query, max_results), timeout=client_timeout) as r:
+                r.raise_for_status()
+                hits = (await r.json()).get("query", {}).get("search", [])
+
+            titles = [h.get("title") for h in hits if h.get("title")]
+            if titles:
+                async with session.get(_WIKI_API, params=self._extract_params(titles), timeout=client_timeout) as r2:
+                    r2.raise_for_status()
+                    snippets = self._snippets_from_pages((await r2.json()).get("query", {}).get("pages", {}))
         except Exception:
             snippets = []
 
-        self._wiki_cache[key] = snippets
-        self._write_cache(self._wiki_cache)
+        self._cache_put(key, snippets)
         return snippets
 
     # ---------------- Retrieval ----------------
-    def retrieve(self, query: str, top_k: int = 3, use_answer_hint: str = "") -> List[Dict[str, Any]]:
-        q = (query + " " + use_answer_hint).strip() if use_answer_hint else query
-        query_emb = self.model.encode([q], convert_to_numpy=True)
-        faiss.normalize_L2(query_emb)
+    # Both caches are process-local and never invalidated: the corpus is
+    # static, so the same query always maps to the same embedding/indices.
+    @lru_cache(maxsize=4096)
+    def _encode_query(self, text: str) -> bytes:
+        # Normalized during pooling — no extra norm pass over the vector.
+        emb = self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True)
+        return emb.tobytes()
+
+    @lru_cache(maxsize=4096)
+    def _search(self, query: str, top_k: int) -> tuple:
+        query_emb = np.frombuffer(self._encode_query(query), dtype=np.float32).reshape(1, -1)
         distances, indices = self.index.search(query_emb, top_k)
-        results = [self.corpus[i] for i in indices[0] if i < len(self.corpus)]
+        return tuple(int(i) for i in indices[0] if 0 <= i < len(self.corpus))
+
+    def _retrieve_local(
+        self,
+        query: str,
+        top_k: int = 3,
+        use_answer_hint: str = "",
+        query_emb: np.ndarray = None,
+    ) -> List[Dict[str, Any]]:
+        q = (query + " " + use_answer_hint).strip() if use_answer_hint else query.strip()
+        if query_emb is not None:
+            # Caller already embedded the query (e.g. via the micro-batcher);
+            # expected unit-normalized, matching the index.
+            emb = np.asarray(query_emb, dtype=np.float32).reshape(1, -1)
+            distances, indices = self.index.search(emb, top_k)
+            idxs = tuple(int(i) for i in indices[0] if 0 <= i < len(self.corpus))
+        else:
+            idxs = self._search(q, top_k)
+        # Tag each hit with its corpus row so callers can reuse the
+        # precomputed embedding instead of re-encoding the passage.
+        return [{**self.corpus[i], "corpus_idx": i} for i in idxs]
+
+    def corpus_embedding(self, row: int) -> np.ndarray:
+        """Precomputed unit-normalized embedding for a corpus row (float32)."""
+        return np.asarray(self.embeddings[row], dtype=np.float32)
+
+    @staticmethod
+    def _needs_fallback(results: List[Dict[str, Any]]) -> bool:
+        return not results or all(len(r.get("text", "").strip()) == 0 for r in results)
+
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 3,
+        use_answer_hint: str = "",
+        query_emb: np.ndarray = None,
+    ) -> List[Dict[str, Any]]:
+        results = self._retrieve_local(query, top_k, use_answer_hint, query_emb)
 
         # If no good results and wiki fallback is allowed
-        if (not results or all(len(r.get("text", "").strip()) == 0 for r in results)) and self.wiki_fallback:
+        if self._needs_fallback(results) and self.wiki_fallback:
             wiki_snips = self._fetch_wikipedia_snippets(query, max_results=top_k)
             if wiki_snips:
                 return wiki_snips
 
         return results
+
+    async def retrieve_async(
+        self,
+        query: str,
+        top_k: int = 3,
+        use_answer_hint: str = "",
+        query_emb: np.ndarray = None,
+    ) -> List[Dict[str, Any]]:
+        """retrieve(), but the FAISS/encode work runs on a worker thread and
+        the Wikipedia fallback goes through the shared aiohttp session."""
+        results = await asyncio.to_thread(
+            self._retrieve_local, query, top_k, use_answer_hint, query_emb
+        )
+
+        if self._needs_fallback(results) and self.wiki_fallback:
+            wiki_snips = await self._fetch_wikipedia_snippets_async(query, max_results=top_k)
+            if wiki_snips:
+                return wiki_snips
+
+        return results
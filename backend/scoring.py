@@ -1,27 +1,63 @@
 # backend/scoring.py
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import re
 from typing import List, Dict
 
 # Lightweight stopword list for coverage calc (kept local to avoid extra deps)
-_STOPWORDS = set((
+_STOPWORDS = frozenset((
     "a an the of in on at is are was were be been being to for and or if then else with by as from that "
     "this these those it its into over under not no but so do does did done have has had you your we our "
     "they their them he she his her who whom which what when where why how".split()
 ))
 
+# Compiled once at import instead of re-parsed on every _keywords call
+_KW_RE = re.compile(r"[A-Za-z][A-Za-z0-9\-]+")
+
+# Optional Numba fast path: JIT-compiled ASCII scan over a uint8 byte view
+# instead of the regex engine. Falls back to the regex when numba is absent.
+try:
+    from numba import njit
+
+    @njit(cache=True)
+    def _token_spans(buf: np.ndarray) -> np.ndarray:
+        """(start, end) offsets of alphanumeric runs in buf that start with a
+        letter and are longer than 2 bytes — same tokens _KW_RE would find."""
+        n = buf.shape[0]
+        spans = np.empty((n // 3 + 1, 2), dtype=np.int64)
+        count = 0
+        i = 0
+        while i < n:
+            c = buf[i]
+            if (65 <= c <= 90) or (97 <= c <= 122):  # [A-Za-z] starts a token
+                start = i
+                i += 1
+                while i < n:
+                    c = buf[i]
+                    if (65 <= c <= 90) or (97 <= c <= 122) or (48 <= c <= 57) or c == 45:
+                        i += 1
+                    else:
+                        break
+                if i - start > 2:
+                    spans[count, 0] = start
+                    spans[count, 1] = i
+                    count += 1
+            else:
+                i += 1
+        return spans[:count]
+
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+
 def _keywords(text: str) -> List[str]:
     # alphanum tokens; keep hyphenated words; lowercase; filter stopwords & short tokens
-    toks = re.findall(r"[A-Za-z][A-Za-z0-9\-]+", text.lower())
-    return [t for t in toks if t not in _STOPWORDS and len(t) > 2]
-
-def _safe_cosine(mat_a: np.ndarray, vec_b: np.ndarray) -> np.ndarray:
-    """cosine similarity between each row in mat_a and vec_b (1 x d)."""
-    denom = (np.linalg.norm(mat_a, axis=1) * np.linalg.norm(vec_b))
-    # avoid divide-by-zero
-    denom = np.where(denom == 0, 1e-8, denom)
-    return np.dot(mat_a, vec_b.T).reshape(-1) / denom
+    if not _HAS_NUMBA:
+        toks = _KW_RE.findall(text.lower())
+        return [t for t in toks if t not in _STOPWORDS and len(t) > 2]
+    raw = text.lower().encode("utf-8")
+    spans = _token_spans(np.frombuffer(raw, dtype=np.uint8))
+    toks = [raw[s:e].decode("ascii") for s, e in spans]
+    return [t for t in toks if t not in _STOPWORDS]
 
 class HallucinationScorer:
     """
@@ -33,9 +69,11 @@ class HallucinationScorer:
     """
     def __init__(self, retrieval_engine):
         self.retrieval_engine = retrieval_engine
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+        # Share the model already loaded by the retrieval engine (one copy of
+        # the weights per process instead of three).
+        self.model = retrieval_engine.model
 
-    def evaluate(self, answer: str, evidence_docs: List[Dict]):
+    def evaluate(self, answer: str, evidence_docs: List[Dict], answer_emb: np.ndarray = None):
         evidence_texts = [doc["text"] for doc in evidence_docs]
         if not evidence_texts:
             return {
@@ -49,16 +87,45 @@ class HallucinationScorer:
             }
 
         # --- Embedding similarity (confidence) ---
-        answer_emb = self.model.encode([answer], convert_to_numpy=True)
-        evidence_emb = self.model.encode(evidence_texts, convert_to_numpy=True)
-        sims = _safe_cosine(evidence_emb, answer_emb)
+        # One batched encode covers everything that still needs embedding:
+        # the answer (unless the caller already embedded it) and any evidence
+        # passage without a precomputed index vector (wiki snippets). Corpus
+        # hits reuse the embeddings built for the FAISS index.
+        to_encode = []
+        if answer_emb is None:
+            to_encode.append(answer)
+        refs = []  # per evidence doc: ('corpus', row) or ('encode', pos)
+        for doc in evidence_docs:
+            row = doc.get("corpus_idx")
+            if row is not None:
+                refs.append(("corpus", row))
+            else:
+                refs.append(("encode", len(to_encode)))
+                to_encode.append(doc["text"])
+        embs = None
+        if to_encode:
+            embs = self.model.encode(
+                to_encode, convert_to_numpy=True, normalize_embeddings=True, batch_size=32
+            )
+
+        # Vectors are unit-length, so the matmul below is already the cosine
+        # (same trick as the faiss IndexFlatIP + normalize_L2 combo the
+        # retrieval index uses).
+        answer_vec = embs[0] if answer_emb is None else np.asarray(answer_emb).reshape(-1)
+        evidence_emb = np.stack([
+            self.retrieval_engine.corpus_embedding(ref) if kind == "corpus" else embs[ref]
+            for kind, ref in refs
+        ])
+        sims = evidence_emb @ answer_vec
         avg_conf = float(np.clip(np.mean(sims), -1.0, 1.0))  # keep within [-1,1]
 
         # --- Keyword coverage (explainability) ---
+        # Tokenize the evidence once into a set: hash lookups per answer term
+        # instead of substring scans over the concatenated evidence string.
         ans_keys = list(set(_keywords(answer)))
-        ev_concat = " ".join(evidence_texts).lower()
-        matched = [k for k in ans_keys if k in ev_concat]
-        missing = [k for k in ans_keys if k not in ev_concat]
+        ev_tokens = set(_keywords(" ".join(evidence_texts)))
+        matched = [k for k in ans_keys if k in ev_tokens]
+        missing = [k for k in ans_keys if k not in ev_tokens]
         coverage = round((len(matched) / max(1, len(ans_keys))) * 100.0, 2)
 
         # Default verdict buckets (frontend can override via thresholds)
@@ -1,63 +1,111 @@
 # frontend/streamlit_app.py
+import asyncio
+import functools
+import gzip
 import os
 import json
+import re
 import time
 import streamlit as st
-import requests
+import httpx
+import numpy as np
 import pandas as pd
 from typing import Dict, Any, List
 
+# Faster event loop for the asyncio.run() verify fan-out when available
+# (Linux-only wheel, so it's opportunistic rather than a hard dependency).
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 # -------------------- Config --------------------
 BACKEND_URL_DEFAULT = os.environ.get("BACKEND_URL", "http://127.0.0.1:8000")
 st.set_page_config(page_title="Hallucination Detector", page_icon="🧠", layout="wide")
 
-# -------------------- Styles --------------------
-CUSTOM_CSS = """
-<style>
-/* App-wide tweaks */
-.block-container {padding-top: 1.2rem; padding-bottom: 2rem; max-width: 1100px;}
-/* Header card */
-.header-card {
-  background: linear-gradient(135deg, #0f172a 0%, #1f2937 60%, #0f172a 100%);
-  color: #e5e7eb; border-radius: 16px; padding: 20px 22px; margin-bottom: 10px;
-  border: 1px solid rgba(255,255,255,0.08);
-}
-.header-title {font-size: 1.5rem; font-weight: 700; margin: 0 0 .35rem 0;}
-.header-sub {opacity: .9; margin: 0;}
-/* Status badges */
-.badge {
-  display: inline-block; padding: 6px 10px; border-radius: 12px; font-weight: 600; font-size: .92rem;
-  border: 1px solid rgba(0,0,0,.08);
-}
-.badge-green {background: #dcfce7; color: #065f46; border-color: #bbf7d0;}
-.badge-amber {background: #fef9c3; color: #854d0e; border-color: #fde68a;}
-.badge-red {background: #fee2e2; color: #7f1d1d; border-color: #fecaca;}
-/* Cards */
-.card {
-  border: 1px solid #e5e7eb; border-radius: 14px; padding: 16px 18px; background: #ffffff;
-  box-shadow: 0 1px 1px rgba(16,24,40,.04);
-}
-.card h4 {margin-top: 0;}
-/* Footer */
-.footer {
-  margin-top: 24px; padding-top: 14px; border-top: 1px dashed #e5e7eb; text-align: center; color: #64748b;
-  font-size: .92rem;
-}
-kbd {background:#f1f5f9;border:1px solid #e2e8f0;border-bottom-width:2px;border-radius:6px;padding:2px 6px}
-</style>
-"""
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+# -------------------- HTTP client --------------------
+# Retry connection establishment a couple of times so a backend that is
+# still booting shows as a short delay instead of a user-visible exception.
+_HTTP_RETRIES = 2
 
-# -------------------- Header --------------------
-st.markdown(
-    """
+def get_http_client(backend_url: str) -> httpx.Client:
+    """One pooled keep-alive client per session — no fresh TCP/TLS handshake
+    per click. Recreated only when the backend URL changes."""
+    if "http" not in st.session_state or st.session_state.get("http_base") != backend_url:
+        old = st.session_state.get("http")
+        if old is not None:
+            old.close()
+        st.session_state.http = httpx.Client(
+            base_url=backend_url,
+            timeout=60,
+            limits=httpx.Limits(max_keepalive_connections=4),
+            transport=httpx.HTTPTransport(retries=_HTTP_RETRIES),
+        )
+        st.session_state.http_base = backend_url
+    return st.session_state.http
+
+# Bodies above this size get gzipped before the POST (3–5x smaller for
+# English text); tiny bodies skip the compressor overhead.
+_GZIP_MIN_BYTES = 2048
+
+def _json_body(payload: Dict[str, Any]):
+    """Serialize a payload, gzipping it when large enough to be worth it.
+    Returns (content, headers) for an httpx post."""
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(body) > _GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+async def _post_verify(client: httpx.AsyncClient, payload: Dict[str, Any]) -> Dict[str, Any]:
+    body, headers = _json_body(payload)
+    r = await client.post("/verify", content=body, headers=headers)
+    r.raise_for_status()
+    return r.json()
+
+def run_verifies(backend_url: str, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """POST every payload to /verify concurrently over one async client.
+    A single verification is just the len-1 case; queued batches fan out
+    with gather instead of paying serial round trips."""
+    async def _run():
+        transport = httpx.AsyncHTTPTransport(retries=_HTTP_RETRIES)
+        async with httpx.AsyncClient(base_url=backend_url, timeout=60, transport=transport) as client:
+            return await asyncio.gather(*[_post_verify(client, p) for p in payloads])
+    return asyncio.run(_run())
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def verify_cached(backend_url: str, question: str, answer: str,
+                  include_counter: bool, th_green: float, th_yellow: float) -> Dict[str, Any]:
+    """Repeat verifications of the same inputs (slider nudges, reruns) become
+    a cache lookup instead of a round trip through model inference.
+    Latency is measured by the caller so timings aren't cached."""
+    payload = {
+        "question": question,
+        "answer": answer,
+        "include_counter": include_counter,
+        "threshold_green": th_green,
+        "threshold_yellow": th_yellow,
+    }
+    return run_verifies(backend_url, [payload])[0]
+
+# -------------------- Styles --------------------
+# The stylesheet lives in frontend/static/style.css and is served by
+# Streamlit's static file server (see .streamlit/config.toml), so the
+# browser caches it instead of receiving the CSS inside every rerun.
+# The constants below are built once at import, never per rerun.
+CSS_LINK = "<link rel='stylesheet' href='app/static/style.css'>"
+HEADER_HTML = """
     <div class="header-card">
       <div class="header-title">🧠 Hallucination Detector</div>
       <p class="header-sub">Lightweight • Transparent • Explainable — Retrieval ✚ Confidence ✚ Rationale ✚ Counter-Evidence</p>
     </div>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+st.markdown(CSS_LINK, unsafe_allow_html=True)
+
+# -------------------- Header --------------------
+st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 # -------------------- Sidebar (quick backend switch) --------------------
 with st.sidebar:
@@ -65,7 +113,7 @@ with st.sidebar:
     backend_url = st.text_input("Backend URL", value=BACKEND_URL_DEFAULT, help="FastAPI base URL (e.g., http://127.0.0.1:8000)")
     if st.button("Ping /health", use_container_width=True):
         try:
-            r = requests.get(f"{backend_url}/health", timeout=5)
+            r = get_http_client(backend_url).get("/health", timeout=5)
             r.raise_for_status()
             st.success(f"Health OK: {r.json()}")
         except Exception as e:
@@ -92,27 +140,58 @@ def confidence_band(conf_pct: float, th_green: int, th_yellow: int) -> str:
         return "⚠️ Medium"
     return "❌ Low"
 
-def highlight_keywords(text: str, matched: List[str]) -> str:
-    """Bold matched keywords (case-insensitive)."""
-    shown = text
-    # Sort by length to avoid partial overlaps
-    for k in sorted(set(matched or []), key=len, reverse=True):
-        if not k or len(k) < 2:
-            continue
-        shown = shown.replace(k, f"**{k}**")
-        shown = shown.replace(k.capitalize(), f"**{k.capitalize()}**")
-        shown = shown.replace(k.upper(), f"**{k.upper()}**")
-    return shown
+@functools.lru_cache(maxsize=64)
+def highlight_pattern(matched: tuple):
+    """Compiled alternation over the matched keywords, or None when empty.
+    Dedupe/filter once per verify response; sorted by length so longer
+    keywords win over their substrings in the alternation."""
+    keywords = sorted({k for k in matched if k and len(k) >= 2}, key=len, reverse=True)
+    if not keywords:
+        return None
+    return re.compile(r"\b(" + "|".join(re.escape(k) for k in keywords) + r")\b", re.IGNORECASE)
+
+def highlight_keywords(text: str, pattern) -> str:
+    """Bold matched keywords (case-insensitive) in a single regex pass."""
+    return pattern.sub(lambda m: f"**{m.group(0)}**", text) if pattern else text
+
+def build_payload(question: str, answer: str, include_counter: bool, th_green: int, th_yellow: int) -> Dict[str, Any]:
+    return {
+        "question": question.strip(),
+        "answer": answer.strip(),
+        "include_counter": include_counter,
+        "threshold_green": th_green / 100.0,
+        "threshold_yellow": th_yellow / 100.0,
+    }
+
+_HISTORY_COLUMNS = ["question", "answer", "verdict", "confidence", "coverage", "rationale", "ts"]
 
 def add_to_history(item: Dict[str, Any]):
-    if "history" not in st.session_state:
-        st.session_state.history = []
-    st.session_state.history.append(item)
+    # The DataFrame IS the session store: append one row per run instead of
+    # rebuilding the whole frame from a list on every rerun. Coerce numbers
+    # here so the columns stay float64 and aggregations skip pandas' parsing.
+    cov = item.get("coverage")
+    item = {**item, "coverage": float(cov) if cov is not None else float("nan")}
+    df = st.session_state.get("history_df")
+    row = pd.DataFrame([item])
+    st.session_state.history_df = (
+        row if df is None or df.empty
+        else pd.concat([df, row], ignore_index=True, copy=False)
+    )
 
 def get_history_df() -> pd.DataFrame:
-    if "history" in st.session_state and st.session_state.history:
-        return pd.DataFrame(st.session_state.history)
-    return pd.DataFrame(columns=["question", "answer", "verdict", "confidence", "coverage", "rationale", "ts"])
+    df = st.session_state.get("history_df")
+    return df if df is not None else pd.DataFrame(columns=_HISTORY_COLUMNS)
+
+def _history_csv(n_rows: int) -> bytes:
+    """CSV bytes for the download button, re-encoded only when the history
+    grows. History is append-only within a session, so the row count is a
+    sufficient key; kept in session_state (not st.cache_data) so one user's
+    history never serves another's download."""
+    cached = st.session_state.get("history_csv")
+    if cached is None or cached[0] != n_rows:
+        cached = (n_rows, get_history_df().to_csv(index=False).encode("utf-8"))
+        st.session_state.history_csv = cached
+    return cached[1]
 
 # -------------------- Tabs --------------------
 tab_verify, tab_session, tab_settings, tab_about = st.tabs(["🔍 Verify", "📈 Session", "⚙️ Settings", "ℹ️ About"])
@@ -135,12 +214,13 @@ with tab_settings:
     colA, colB = st.columns(2)
     with colA:
         if st.button("Clear Session History", use_container_width=True):
-            st.session_state.pop("history", None)
+            st.session_state.pop("history_df", None)
+            st.session_state.pop("history_csv", None)
             st.success("Cleared.")
     with colB:
         df = get_history_df()
         if not df.empty:
-            csv = df.to_csv(index=False).encode("utf-8")
+            csv = _history_csv(len(df))
             st.download_button("Download History CSV", data=csv, file_name="hallucination_session.csv",
                                mime="text/csv", use_container_width=True)
         else:
@@ -149,33 +229,72 @@ with tab_settings:
 # -------------------- Verify --------------------
 with tab_verify:
     st.subheader("Enter Question & Answer")
-    c1, c2 = st.columns(2)
-    with c1:
-        question = st.text_area("❓ Question", placeholder="Who founded SpaceX?")
-    with c2:
-        answer = st.text_area("💬 AI Answer (to verify)", placeholder="Jeff Bezos founded SpaceX in 2002.")
-    go = st.button("Verify Answer", type="primary", use_container_width=True)
+    # Form: typing in the text areas no longer triggers a full script rerun
+    # per keystroke — the script runs once per submit instead.
+    with st.form("verify"):
+        c1, c2 = st.columns(2)
+        with c1:
+            question = st.text_area("❓ Question", placeholder="Who founded SpaceX?")
+        with c2:
+            answer = st.text_area("💬 AI Answer (to verify)", placeholder="Jeff Bezos founded SpaceX in 2002.")
+        go = st.form_submit_button("Verify Answer", type="primary", use_container_width=True)
+        queue_it = st.form_submit_button("Add to batch", use_container_width=True)
+
+    # ----- Batch queue: collect several Q/A pairs, verify them in ONE
+    # /verify_batch round trip instead of a POST per pair -----
+    pending: List[Dict[str, Any]] = st.session_state.setdefault("pending", [])
+    if queue_it:
+        if question.strip() and answer.strip():
+            pending.append(build_payload(question, answer, include_counter, th_green, th_yellow))
+        else:
+            st.warning("Provide both Question and Answer before queueing.")
+    bq2, bq3 = st.columns(2)
+    with bq2:
+        run_batch = st.button(f"Run batch ({len(pending)})", use_container_width=True,
+                              disabled=not pending)
+    with bq3:
+        if st.button("Clear batch", use_container_width=True, disabled=not pending):
+            pending.clear()
+
+    if run_batch and pending:
+        try:
+            body, headers = _json_body({"items": pending})
+            resp = get_http_client(backend_url).post("/verify_batch", content=body, headers=headers)
+            resp.raise_for_status()
+            batch_results = resp.json().get("results", [])
+            st.subheader(f"📦 Batch results ({len(batch_results)})")
+            for item, res in zip(pending, batch_results):
+                verdict = res.get("verdict", "Unverifiable")
+                conf = float(res.get("confidence", 0.0))
+                st.markdown('<div class="card">', unsafe_allow_html=True)
+                st.markdown(f"**{item['question']}** → {verdict_badge(verdict, conf)}", unsafe_allow_html=True)
+                st.write(f"{res.get('rationale', '')}")
+                st.markdown("</div>", unsafe_allow_html=True)
+                add_to_history({
+                    "question": item["question"],
+                    "answer": item["answer"],
+                    "verdict": verdict,
+                    "confidence": conf,
+                    "coverage": res.get("coverage"),
+                    "rationale": res.get("rationale", ""),
+                    "ts": pd.Timestamp.utcnow().isoformat(timespec="seconds")
+                })
+            pending.clear()
+        except Exception as e:
+            st.error(f"Batch verification failed: {e}")
 
     if go:
         if not question.strip() or not answer.strip():
             st.warning("Please provide both **Question** and **AI Answer**.")
         else:
-            payload = {
-                "question": question.strip(),
-                "answer": answer.strip(),
-                "include_counter": include_counter,
-                "threshold_green": (st.session_state.get("th_green") or 70) / 100.0,
-                "threshold_yellow": (st.session_state.get("th_yellow") or 40) / 100.0
-            }
-            # Use the sliders from Settings directly (not session_state mirror)
-            payload["threshold_green"] = th_green / 100.0
-            payload["threshold_yellow"] = th_yellow / 100.0
+            payload = build_payload(question, answer, include_counter, th_green, th_yellow)
 
             try:
                 t0 = time.time()
-                resp = requests.post(f"{backend_url}/verify", json=payload, timeout=60)
-                resp.raise_for_status()
-                data: Dict[str, Any] = resp.json()
+                data: Dict[str, Any] = verify_cached(
+                    backend_url, payload["question"], payload["answer"],
+                    include_counter, payload["threshold_green"], payload["threshold_yellow"],
+                )
                 latency_ms = (time.time() - t0) * 1000
 
                 verdict = data.get("verdict", "Unverifiable")
@@ -185,6 +304,8 @@ with tab_verify:
                 cov = data.get("coverage")
                 matched = data.get("matched_keywords", []) or []
                 missing = data.get("missing_keywords", []) or []
+                # One compiled pattern per response, reused for every passage.
+                hl_pattern = highlight_pattern(tuple(matched))
 
                 # ----- Status card -----
                 st.markdown('<div class="card">', unsafe_allow_html=True)
@@ -203,7 +324,7 @@ with tab_verify:
                     else:
                         for i, e in enumerate(evidence, 1):
                             text = e["text"] if isinstance(e, dict) and "text" in e else str(e)
-                            st.markdown(f"**{i}.** {highlight_keywords(text, matched)}")
+                            st.markdown(f"**{i}.** {highlight_keywords(text, hl_pattern)}")
 
                     # keyword chips
                     if matched:
@@ -213,25 +334,31 @@ with tab_verify:
 
                 # ----- Counter-evidence -----
                 ce = data.get("counter_evidence")
-                if ce:
+                if ce and ce.get("analysis"):
                     st.subheader("🛡️ Counter-Evidence")
-                    rows: List[Dict[str, Any]] = []
-                    for item in ce.get("analysis", []):
-                        rows.append({
-                            "Claim": item.get("claim", ""),
-                            "Status": item.get("status", ""),
-                            "Support %": item.get("support_score", 0.0),
-                            "Contradiction %": item.get("contradiction_score", 0.0),
-                            "Support Passage": item.get("support_passage", ""),
-                            "Counter Passage": item.get("counter_passage", ""),
+                    # Let pandas build the frame in C instead of copying keys
+                    # through a Python dict per claim.
+                    df_ce = (
+                        pd.DataFrame(ce["analysis"])
+                        .reindex(columns=["claim", "status", "support_score",
+                                          "contradiction_score", "support_passage", "counter_passage"])
+                        .rename(columns={
+                            "claim": "Claim",
+                            "status": "Status",
+                            "support_score": "Support %",
+                            "contradiction_score": "Contradiction %",
+                            "support_passage": "Support Passage",
+                            "counter_passage": "Counter Passage",
                         })
-                    st.dataframe(rows, use_container_width=True, height=240)
+                    )
+                    st.dataframe(df_ce, use_container_width=True, height=240)
 
-                # ----- Mini charts (bar for latest) -----
+                # ----- Latest metrics (two floats don't need a chart) -----
                 st.subheader("📊 Latest — Confidence vs Coverage")
                 latest_cov = float(cov) if cov is not None else 0.0
-                chart_df = pd.DataFrame({"Metric": ["Confidence", "Coverage"], "Value": [conf, latest_cov]}).set_index("Metric")
-                st.bar_chart(chart_df)
+                col_c, col_v = st.columns(2)
+                col_c.metric("Confidence", f"{conf:.2f}%")
+                col_v.metric("Coverage", f"{latest_cov:.2f}%")
 
                 # ----- Add to history -----
                 add_to_history({
@@ -248,7 +375,10 @@ with tab_verify:
                 st.error(f"Verification failed: {e}")
 
 # -------------------- Session --------------------
-with tab_session:
+@st.fragment
+def _render_session():
+    # Fragment: reruns triggered elsewhere (Settings sliders, Verify inputs)
+    # don't re-serialize the history table and charts.
     st.subheader("Run History")
     df = get_history_df()
     if df.empty:
@@ -266,23 +396,34 @@ with tab_session:
             st.markdown('</div>', unsafe_allow_html=True)
         with c3:
             st.markdown('<div class="card"><h4>Avg Coverage</h4>', unsafe_allow_html=True)
-            cov_mean = pd.to_numeric(df["coverage"], errors="coerce").fillna(0.0).mean()
+            # Columns are float64 from insert time: one C loop, no coercion.
+            cov_vals = df["coverage"].to_numpy(dtype=float)
+            cov_mean = np.nanmean(cov_vals) if not np.isnan(cov_vals).all() else 0.0
             st.metric("Coverage %", f"{cov_mean:.1f}")
             st.markdown('</div>', unsafe_allow_html=True)
 
-        # Trend chart
+        # Trend chart — built from just the two numeric columns instead of
+        # copying and mutating the whole history frame each rerun.
         st.subheader("📉 Trend — Confidence & Coverage")
-        df_plot = df.copy()
-        df_plot["coverage"] = pd.to_numeric(df_plot.get("coverage"), errors="coerce").fillna(0.0)
-        df_plot["confidence"] = pd.to_numeric(df_plot.get("confidence"), errors="coerce").fillna(0.0)
-        df_plot["run"] = range(1, len(df_plot) + 1)
-        trend_df = df_plot.set_index("run")[["confidence", "coverage"]]
-        trend_df.rename(columns={"confidence": "Confidence %", "coverage": "Coverage %"}, inplace=True)
+        trend_df = pd.DataFrame({
+            "Confidence %": pd.to_numeric(df["confidence"], errors="coerce").fillna(0.0).to_numpy(),
+            "Coverage %": pd.to_numeric(df["coverage"], errors="coerce").fillna(0.0).to_numpy(),
+        })
+        trend_df.index = np.arange(1, len(df) + 1)
+        trend_df.index.name = "run"
         st.line_chart(trend_df)
 
-        # Table
+        # Table — only ship the last N rows to the browser; a full history
+        # re-serialized every rerun gets painful past a few hundred runs.
         st.markdown("### 📋 Runs Table")
-        st.dataframe(df[["ts", "verdict", "confidence", "coverage", "question", "answer"]].iloc[::-1], use_container_width=True, height=360)
+        n = int(st.number_input("Show last N runs", min_value=10, max_value=1000, value=50, step=10))
+        recent = df.tail(n).iloc[::-1]
+        st.dataframe(recent[["ts", "verdict", "confidence", "coverage"]], use_container_width=True, height=360)
+        with st.expander("Show Q/A text"):
+            st.dataframe(recent[["question", "answer"]], use_container_width=True)
+
+with tab_session:
+    _render_session()
 
 # -------------------- About --------------------
 with tab_about: